@@ -1,31 +1,358 @@
 from typing import Any, List, Dict, Optional, Tuple, Union
+import contextlib
+import copy
+from functools import cache, lru_cache
 import httpx
 from mcp.server.fastmcp import FastMCP
 import random
 import kagglehub
 import os
+import tempfile
+import threading
 import pandas as pd
-from scipy.stats import linregress
+from scipy.stats import t as student_t
 import numpy as np
+import matplotlib
+# Plots are only ever written to files, so use the non-interactive Agg backend (set before pyplot is imported)
+matplotlib.use('Agg')
+import matplotlib.dates as mdates
 import matplotlib.pyplot as plt
 import seaborn as sns
 from datetime import datetime
+from itertools import compress
 
 # Initialize FastMCP server
 mcp = FastMCP("pollution-trends")
 
-# load the kaggle dataset 
-path = kagglehub.dataset_download("adityaramachandran27/world-air-quality-index-by-city-and-coordinates")
-downloaded_files = os.listdir(path)
-csv_file = [f for f in downloaded_files if f.endswith('.csv')][0]
-# The 'Date' column in this dataset is not uniformly formatted, causing parsing errors.
-# We will read it as a string and handle conversions within the analysis tool.
-# For a real-world scenario, cleaning this column upon loading would be ideal.
-df = pd.read_csv(os.path.join(path, csv_file))
+DATASET = "adityaramachandran27/world-air-quality-index-by-city-and-coordinates"
+# Cleaned copy of the dataset, written on first load so later server starts skip the download and CSV parsing
+# (delete it to pick up a new version of the dataset)
+SNAPSHOT_PATH = os.path.join(os.path.expanduser("~"), ".cache", "pollution_trends", "data.pkl")
+# Bumped whenever the cleaned layout changes, so snapshots written by older code are rebuilt
+_SNAPSHOT_FORMAT = 4
+
+# AQI values are small integers and the city, country and category strings have few distinct values,
+# so they are stored as the smallest integer type that holds them (int16 for AQI values up to 500)
+# and as category columns to cut the bytes moved per scan; means are still computed in float64
+AQI_VALUE_COLS = ['AQI Value', 'PM2.5 AQI Value', 'Ozone AQI Value', 'NO2 AQI Value', 'CO AQI Value']
+CATEGORY_COLS = ['City', 'Country', 'AQI Category',
+                 'PM2.5 AQI Category', 'Ozone AQI Category', 'NO2 AQI Category', 'CO AQI Category']
+POLLUTANT_COLS = {
+    'PM2.5': 'PM2.5 AQI Value', 'Ozone': 'Ozone AQI Value',
+    'NO2': 'NO2 AQI Value', 'CO': 'CO AQI Value'
+}
+
+# Only the columns used by the analysis are materialized
+_ANALYSIS_COLUMNS = ['City', 'Date', 'AQI Value', 'AQI Category', *POLLUTANT_COLS.values()]
+
+def _read_snapshot() -> Optional[Tuple[pd.DataFrame, Optional[pd.Series]]]:
+    """
+    Return the frame and parsed dates stored in the snapshot,
+    or None (removing the file) if it is missing, unreadable or outdated.
+    """
+    if not os.path.exists(SNAPSHOT_PATH):
+        return None
+    try:
+        snapshot = pd.read_pickle(SNAPSHOT_PATH)
+        if isinstance(snapshot, dict) and snapshot.get('format') == _SNAPSHOT_FORMAT:
+            return snapshot['df'], snapshot['dates']
+    except Exception:
+        # Truncated or corrupt file, or a pickle this pandas version can't read: rebuild it below
+        pass
+    with contextlib.suppress(OSError):
+        os.remove(SNAPSHOT_PATH)
+    return None
+
+def _write_snapshot(df: pd.DataFrame, dates: Optional[pd.Series]) -> None:
+    """
+    Write the snapshot atomically (to a temporary file that then replaces it).
+    Failing to write it only costs the faster start next time, so errors are ignored.
+    """
+    snapshot_dir = os.path.dirname(SNAPSHOT_PATH)
+    try:
+        os.makedirs(snapshot_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=snapshot_dir, suffix='.tmp')
+        os.close(fd)
+        try:
+            pd.to_pickle({'format': _SNAPSHOT_FORMAT, 'df': df, 'dates': dates}, tmp_path)
+            os.replace(tmp_path, SNAPSHOT_PATH)
+        finally:
+            with contextlib.suppress(OSError):
+                os.remove(tmp_path)
+    except OSError:
+        pass
+
+@cache
+def _load_dataset() -> Tuple[pd.DataFrame, Optional[pd.Series], Tuple[str, float]]:
+    """
+    Load the dataset on first use rather than at import, along with its parsed dates
+    and a version identifying the file it came from.
+    Reads the snapshot if it is usable, otherwise downloads the kaggle dataset and (re)writes the snapshot.
+    """
+    snapshot = _read_snapshot()
+    if snapshot is not None:
+        return *snapshot, (SNAPSHOT_PATH, os.path.getmtime(SNAPSHOT_PATH))
+
+    # load the kaggle dataset
+    path = kagglehub.dataset_download(DATASET)
+    downloaded_files = os.listdir(path)
+    csv_file = [f for f in downloaded_files if f.endswith('.csv')][0]
+    csv_path = os.path.join(path, csv_file)
+    df = pd.read_csv(csv_path, dtype=dict.fromkeys(CATEGORY_COLS, 'category'))
+    # Only integer columns are downcast, so values (and their JSON form) stay exactly as parsed;
+    # a column with missing values is read as float64 and left unchanged
+    for col in AQI_VALUE_COLS:
+        if col in df.columns and pd.api.types.is_integer_dtype(df[col]):
+            df[col] = pd.to_numeric(df[col], downcast='integer')
+    # The 'Date' column in this dataset is not uniformly formatted, causing parsing errors.
+    # Parse it once here, the same way the tools parse dates passed in, so the analysis doesn't have to.
+    # The parsed dates are kept apart from the frame: fetch_tool returns the original strings,
+    # since NaT and Timestamp values don't serialize in tool results.
+    dates = _ensure_datetime(df['Date']) if 'Date' in df.columns else None
+
+    _write_snapshot(df, dates)
+    return df, dates, (csv_path, os.path.getmtime(csv_path))
+
+def _get_df() -> pd.DataFrame:
+    """The dataset, loaded on first use."""
+    return _load_dataset()[0]
+
+def _get_dates() -> Optional[pd.Series]:
+    """The dataset's 'Date' column parsed to datetime64 (unparseable values as NaT), or None if it has none."""
+    return _load_dataset()[1]
+
+def _data_version() -> Tuple[str, float]:
+    """Identifies the loaded data; part of the cache keys so a reloaded dataset is never served stale results."""
+    return _load_dataset()[2]
+
+@cache
+def _get_available() -> Tuple[frozenset, frozenset]:
+    """Available cities and countries (frozensets for O(1) membership checks)."""
+    df = _get_df()
+    return frozenset(df['City'].unique()), frozenset(df['Country'].unique())
+
+@cache
+def _get_locations() -> Tuple[List[Dict[str, str]], np.ndarray, np.ndarray]:
+    """
+    Unique (City, Country) records, computed once so location_tool does not have to deduplicate
+    the full dataset on every call, plus lower-cased city and country arrays for matching user input
+    (missing countries become '').
+    """
+    unique_loc_df = _get_df()[['City', 'Country']].drop_duplicates().reset_index(drop=True)
+    return (
+        unique_loc_df.to_dict('records'),
+        np.char.lower(unique_loc_df['City'].to_numpy(dtype=str, na_value='')),
+        np.char.lower(unique_loc_df['Country'].to_numpy(dtype=str, na_value='')),
+    )
+
+@cache
+def _get_city_indices() -> Dict[str, np.ndarray]:
+    """Positional row indices of every city, so fetch_tool can select rows without scanning the data."""
+    return _get_df().groupby('City', sort=False, observed=True).indices
+
+@cache
+def _get_city_dtype() -> pd.CategoricalDtype:
+    """The categorical dtype of the dataset's City column."""
+    return _get_df()['City'].dtype
+
+def __getattr__(name: str) -> Any:
+    # The dataset and the globals derived from it are only loaded when first accessed
+    if name == 'df':
+        return _get_df()
+    if name == 'AVAILABLE_CITIES':
+        return _get_available()[0]
+    if name == 'AVAILABLE_COUNTRIES':
+        return _get_available()[1]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+# A single figure reused (and cleared) by every plot_trends_tool call; the lock serializes access to it
+plt.style.use('seaborn-v0_8-whitegrid')
+_FIG, _AX = plt.subplots(figsize=(15, 8))
+# Fixed margins sized for the rotated date labels, instead of running tight_layout on every call
+_FIG.subplots_adjust(bottom=0.14, left=0.06, right=0.98, top=0.93)
+_PLOT_LOCK = threading.Lock()
+
+def _ensure_datetime(dates: pd.Series) -> pd.Series:
+    """Return dates as datetime64, parsing them (coercing errors to NaT) only if needed."""
+    if pd.api.types.is_datetime64_any_dtype(dates):
+        return dates
+    # The dates are mixed-format, so each one is parsed on its own ('mixed') rather than with a format guessed
+    # from the first value; that way any subset of the dataset's rows parses exactly as it did at load
+    return pd.to_datetime(dates, errors='coerce', format='mixed')
+
+def _linear_trends(analysis_df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Fit AQI Value against days since each city's first date, for all cities at once.
+    Returns a frame indexed by city with the number of points, slope, r-value and two-sided p-value,
+    matching scipy.stats.linregress but computed from grouped sums instead of one call per city.
+    """
+    data = analysis_df.dropna(subset=['AQI Value'])
+    cities = data['City']
+    # Convert dates to numerical values (days from the start) for regression
+    days = (data['Date'] - data['Date'].groupby(cities, observed=True).transform('min')).dt.days
+    xy = pd.DataFrame({'x': days, 'y': data['AQI Value']}, dtype=float)
+    centred = xy - xy.groupby(cities, observed=True).transform('mean')
+    dx, dy = centred['x'], centred['y']
+    sums = pd.DataFrame({'n': 1, 'sxx': dx * dx, 'sxy': dx * dy, 'syy': dy * dy}).groupby(cities, observed=True).sum()
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        slope = sums['sxy'] / sums['sxx']
+        r_value = (sums['sxy'] / np.sqrt(sums['sxx'] * sums['syy'])).clip(-1.0, 1.0)
+        dof = sums['n'] - 2
+        t_stat = r_value * np.sqrt(dof / ((1.0 - r_value + 1e-20) * (1.0 + r_value + 1e-20)))
+        p_value = 2 * student_t.sf(np.abs(t_stat), dof)
+    return pd.DataFrame({'n': sums['n'], 'slope': slope, 'r_value': r_value, 'p_value': p_value})
+
+def _fetch_indices(city_names: List[str]) -> np.ndarray:
+    """Return the positional indices of all rows in the dataset for the given cities, in dataset order."""
+    return _city_row_indices(frozenset(city_names), _data_version())
+
+@lru_cache(maxsize=128)
+def _city_row_indices(cities: frozenset, data_version: Tuple[str, float]) -> np.ndarray:
+    """
+    Row positions of the given cities; cached per city set and data version.
+    The array is read-only since every caller gets the same handle: fetch_tool selects its rows with it,
+    and analyze_trends_tool uses it to check input against the dataset and to build the cached analysis.
+    """
+    city_indices = _get_city_indices()
+    matched_indices = [city_indices[city] for city in cities if city in city_indices]
+    row_indices = np.sort(np.concatenate(matched_indices)) if matched_indices else np.empty(0, dtype=np.intp)
+    row_indices.flags.writeable = False
+    return row_indices
+
+def _cities_frame(cities: frozenset, columns: List[str]) -> pd.DataFrame:
+    """Select the requested columns of all rows in the dataset for the given cities."""
+    df = _get_df()
+    col_indices = df.columns.get_indexer([col for col in columns if col in df.columns])
+    return df.iloc[_fetch_indices(cities), col_indices]
+
+def _to_frame(pollution_data: List[Dict[str, Any]], columns: List[str]) -> pd.DataFrame:
+    """Turn tool input back into a DataFrame holding only the requested columns that are present."""
+    present = set().union(*pollution_data)
+    return pd.DataFrame(pollution_data, columns=[col for col in columns if col in present])
+
+def _same_values(values: pd.Series, dataset_values: pd.Series) -> bool:
+    """
+    True if values (tool input) holds exactly dataset_values in the same order, treating all missing values as equal.
+    Category and numeric columns are compared as integer codes and floats instead of boxed Python objects.
+    """
+    if isinstance(dataset_values.dtype, pd.CategoricalDtype):
+        codes = pd.Categorical(values, dtype=dataset_values.dtype).codes
+        # Values outside the dataset's categories are coded -1 like missing ones, so they must not pass as missing
+        return bool(np.array_equal(codes, dataset_values.cat.codes.to_numpy())
+                    and ((codes >= 0) | values.isna().to_numpy()).all())
+    if pd.api.types.is_numeric_dtype(dataset_values.dtype):
+        # Numbers passed in as strings (or any other objects) would be analyzed differently, so they never match
+        return (pd.api.types.is_numeric_dtype(values.dtype)
+                and np.array_equal(values.to_numpy(dtype=float, na_value=np.nan),
+                                   dataset_values.to_numpy(dtype=float, na_value=np.nan), equal_nan=True))
+    # Series.equals compares dtype and values, treating missing values in the same positions as equal
+    return values.reset_index(drop=True).equals(dataset_values.reset_index(drop=True))
+
+def _dataset_cities(analysis_df: pd.DataFrame) -> Optional[frozenset]:
+    """
+    Return the cities in analysis_df if it holds exactly the dataset's analysis columns for them
+    (every column the cached analysis uses, the same rows in the same order, equal values), else None.
+    """
+    # The cached analysis runs on all of _ANALYSIS_COLUMNS, so input missing any of them must be analyzed as given
+    dataset_columns = [col for col in _ANALYSIS_COLUMNS if col in _get_df().columns]
+    if list(analysis_df.columns) != dataset_columns:
+        return None
+    try:
+        cities = frozenset(analysis_df['City'].unique())
+        dataset_df = _cities_frame(cities, dataset_columns)
+        if len(dataset_df) == len(analysis_df) and all(
+                _same_values(analysis_df[col], dataset_df[col]) for col in dataset_columns):
+            return cities
+    except (TypeError, ValueError):
+        # Unhashable or otherwise unexpected values can't be dataset rows
+        pass
+    return None
+
+def _analyze_frame(analysis_df: pd.DataFrame) -> Dict[str, Any]:
+    """Compute the per-city summary and trend returned by analyze_trends_tool."""
+    results = {}
 
-# Global variables
-AVAILABLE_CITIES = df['City'].unique().tolist()
-AVAILABLE_COUNTRIES = df['Country'].unique().tolist()
+    # Rows rebuilt from dictionaries have plain string cities; re-encode them with the dataset's categories
+    # so the groupbys below hash integer codes (unknown cities keep their plain values)
+    if not isinstance(analysis_df['City'].dtype, pd.CategoricalDtype):
+        city_codes = pd.Categorical(analysis_df['City'], dtype=_get_city_dtype())
+        if (city_codes.codes >= 0).all():
+            analysis_df = analysis_df.assign(City=city_codes)
+
+    # Check if a date column exists for time-series analysis
+    has_date_column = 'Date' in analysis_df.columns and analysis_df['Date'].notna().any()
+
+    if has_date_column:
+        # Dataset rows come with the dates parsed at load; only dates passed in as strings need converting
+        analysis_df = analysis_df.assign(Date=_ensure_datetime(analysis_df['Date']))
+        # Drop rows where date conversion failed
+        analysis_df = analysis_df.dropna(subset=['Date'])
+
+    present_cols = {col_name: pollutant_name for pollutant_name, col_name in POLLUTANT_COLS.items()
+                    if col_name in analysis_df.columns}
+    # All per-city summary statistics, including the pollutant means, in one aggregation pass
+    summary = analysis_df.groupby('City', observed=True).agg(**{
+        'Overall AQI': ('AQI Value', 'mean'),
+        'Rows': ('AQI Value', 'size'),
+        **{col_name: (col_name, 'mean') for col_name in present_cols},
+    })
+
+    # Most frequent AQI Category per city (the smallest one on ties, like Series.mode), from one grouped count
+    category_mode = (
+        analysis_df.groupby(['City', 'AQI Category'], observed=True).size().reset_index(name='n')
+        .sort_values('n', ascending=False, kind='stable').drop_duplicates('City')
+        .set_index('City')['AQI Category'].astype(object)
+    )
+    summary['AQI Category'] = category_mode.reindex(summary.index).fillna('N/A')
+
+    # The primary pollutant is the one with the highest mean AQI among the columns present
+    if present_cols:
+        pollutant_means = summary[list(present_cols)]
+        summary['Primary Pollutant'] = (
+            pollutant_means.fillna(-1).idxmax(axis=1).map(present_cols)
+            .where(pollutant_means.notna().any(axis=1), 'N/A')
+        )
+    else:
+        summary['Primary Pollutant'] = 'N/A'
+
+    #analyse data over time
+    trends = _linear_trends(analysis_df) if has_date_column else None
+
+    for city in summary.index:
+        city_results = {}
+        city_results['Overall AQI'] = round(float(summary.at[city, 'Overall AQI']), 2)
+        city_results['AQI Category'] = summary.at[city, 'AQI Category']
+        city_results['Primary Pollutant'] = summary.at[city, 'Primary Pollutant']
+
+        if has_date_column and summary.at[city, 'Rows'] > 2:
+            if city in trends.index and trends.at[city, 'n'] > 2:
+                # Determine trend based on slope and statistical significance (p-value < 0.05)
+                if trends.at[city, 'p_value'] < 0.05:
+                    city_results['Trend'] = 'Improving' if trends.at[city, 'slope'] < 0 else 'Worsening'
+                else:
+                    city_results['Trend'] = 'Stable'
+                city_results['Note'] = (f"Trend based on {trends.at[city, 'n']} data points "
+                                        f"(r-squared: {trends.at[city, 'r_value']**2:.2f}).")
+        else:
+            city_results['Note'] = "Snapshot summary; not enough data for trend analysis."
+
+        results[city] = city_results
+
+    if not results:
+        return {"error": "Could not generate analysis from the provided data."}
+
+    return results
+
+@lru_cache(maxsize=128)
+def _analyze_cities(cities: frozenset, data_version: Tuple[str, float]) -> Dict[str, Any]:
+    """Analyze all rows in the dataset for the given cities; cached per city set and data version."""
+    analysis_df = _cities_frame(cities, _ANALYSIS_COLUMNS)
+    dates = _get_dates()
+    if dates is not None:
+        # Use the dates parsed at load instead of parsing the strings again
+        analysis_df = analysis_df.assign(Date=dates.iloc[_fetch_indices(cities)])
+    return _analyze_frame(analysis_df)
 
 #mcp tool 1: fetching data for city
 @mcp.tool()
@@ -40,27 +367,22 @@ def location_tool(user_input: str = None, random_count: int = 5) -> List[Dict[st
     Returns:
         List of dictionaries containing city and country information
     """
+    unique_loc_records, unique_cities, unique_countries = _get_locations()
     if user_input and len(user_input.strip()) > 0:
-        filtered_df = df.copy()
-        # Try to match either city or country
-        city_match = filtered_df['City'].str.contains(user_input, case=False, na=False)
-        country_match = filtered_df['Country'].str.contains(user_input, case=False, na=False)
-        filtered_df = filtered_df[city_match | country_match]
-
-        if filtered_df.empty:
+        # Try to match either city or country (case-insensitive substring search over the unique locations)
+        needle = user_input.lower()
+        mask = (np.char.find(unique_cities, needle) >= 0) | (np.char.find(unique_countries, needle) >= 0)
+        if not mask.any():
             return [{"error": f"No cities found matching '{user_input}'"}]
     else:
         # If no user input, select random cities from the entire dataset
-        unique_locations = df[['City', 'Country']].drop_duplicates() # Use the original df for random selection
-        if len(unique_locations) <= random_count:
-            return unique_locations.to_dict('records')
-        else:
-            random_indices = random.sample(range(len(unique_locations)), random_count)
-            return unique_locations.iloc[random_indices].to_dict('records')
+        # Copies of the cached records, so callers can't alter the cache
+        if len(unique_loc_records) <= random_count:
+            return [dict(record) for record in unique_loc_records]
+        return [dict(record) for record in random.sample(unique_loc_records, random_count)]
 
-    # For user_input case, return all unique matches
-    unique_locations = filtered_df[['City', 'Country']].drop_duplicates()
-    return unique_locations.to_dict('records')
+    # For user_input case, return copies of all unique matching records
+    return [dict(record) for record in compress(unique_loc_records, mask)]
 
 #mcp tool 2: forecasting air pollution
 @mcp.tool()
@@ -88,19 +410,20 @@ def fetch_tool(cities_info: List[Dict[str, str]]) -> List[Dict[str, Any]]:
         return [] # No valid cities to process
 
     city_names = [info['City'] for info in valid_cities_info]
+    available_cities, _ = _get_available()
+    known_cities = [city for city in city_names if city in available_cities]
 
-    # Filter the global DataFrame 'df' based on the extracted city names
-    # Assuming 'City' column exists in df
-    filtered_data = df[df['City'].isin(city_names)]
-
-    if filtered_data.empty:
+    if not known_cities:
         # If no data found for the given cities, return an informative message
         return [{"error": f"No detailed pollution data found for cities: {', '.join(city_names)}. "
                            "The dataset might not contain detailed pollution metrics for these locations."}]
 
-    # Convert the filtered DataFrame to a list of dictionaries
+    # Look up the precomputed row indices of the requested cities in the dataset
+    row_indices = _fetch_indices(known_cities)
+
+    # Convert the matched rows to a list of dictionaries
     # This will include all columns for the matched rows
-    return filtered_data.to_dict(orient='records')
+    return _get_df().iloc[row_indices].to_dict(orient='records')
 
 
 #mcp tool 3: analyze trends
@@ -121,65 +444,13 @@ def analyze_trends_tool(pollution_data: List[Dict[str, Any]]) -> Dict[str, Any]:
     if not pollution_data or ('error' in pollution_data[0]):
         return {"error": "No data available to analyze. Please fetch data for a city first.", "details": pollution_data}
 
-    analysis_df = pd.DataFrame(pollution_data)
-    results = {}
-
-    # Check if a date column exists for time-series analysis
-    has_date_column = 'Date' in analysis_df.columns and analysis_df['Date'].notna().any()
+    analysis_df = _to_frame(pollution_data, _ANALYSIS_COLUMNS)
+    cities = _dataset_cities(analysis_df)
+    if cities is not None:
+        # Exactly the dataset's rows for these cities: reuse the cached analysis (copied, so callers can't alter the cache)
+        return copy.deepcopy(_analyze_cities(cities, _data_version()))
 
-    if has_date_column:
-        # Attempt to convert 'Date' to datetime, coercing errors to NaT (Not a Time)
-        analysis_df['Date'] = pd.to_datetime(analysis_df['Date'], errors='coerce')
-        # Drop rows where date conversion failed
-        analysis_df.dropna(subset=['Date'], inplace=True)
-
-    pollutant_cols = {
-        'PM2.5': 'PM2.5 AQI Value', 'Ozone': 'Ozone AQI Value',
-        'NO2': 'NO2 AQI Value', 'CO': 'CO AQI Value'
-    }
-
-    for city, group in analysis_df.groupby('City'):
-        city_results = {}
-        city_results['Overall AQI'] = round(group['AQI Value'].mean(), 2)
-        city_results['AQI Category'] = group['AQI Category'].mode()[0] if not group['AQI Category'].mode().empty else 'N/A'
-
-        max_pollutant_val = -1
-        primary_pollutant = 'N/A'
-        for pollutant_name, col_name in pollutant_cols.items():
-            if col_name in group and not group[col_name].isnull().all():
-                current_val = group[col_name].mean()
-                if current_val > max_pollutant_val:
-                    max_pollutant_val = current_val
-                    primary_pollutant = pollutant_name
-        city_results['Primary Pollutant'] = primary_pollutant
-
-        #analyse data over time
-        if has_date_column and len(group) > 2:
-            # Sort by date and prepare data for regression
-            sorted_group = group.sort_values('Date').dropna(subset=['AQI Value'])
-            if len(sorted_group) > 2:
-                # Convert dates to numerical values (days from the start) for regression
-                days = (sorted_group['Date'] - sorted_group['Date'].min()).dt.days
-                aqi_values = sorted_group['AQI Value']
-                
-                # Perform linear regression
-                slope, _, r_value, p_value, _ = linregress(days, aqi_values)
-                
-                # Determine trend based on slope and statistical significance (p-value < 0.05)
-                if p_value < 0.05:
-                    city_results['Trend'] = 'Improving' if slope < 0 else 'Worsening'
-                else:
-                    city_results['Trend'] = 'Stable'
-                city_results['Note'] = f"Trend based on {len(sorted_group)} data points (r-squared: {r_value**2:.2f})."
-        else:
-            city_results['Note'] = "Snapshot summary; not enough data for trend analysis."
-        
-        results[city] = city_results
-
-    if not results:
-        return {"error": "Could not generate analysis from the provided data."}
-
-    return results
+    return _analyze_frame(analysis_df)
 
 
 #mcp tool 4: compare cities
@@ -205,15 +476,14 @@ def plot_trends_tool(pollution_data: List[Dict[str, Any]], output_dir: str = "ai
     if not pollution_data or ('error' in pollution_data[0]):
         return {"error": "No data available to plot.", "details": pollution_data}
 
-    plot_df = pd.DataFrame(pollution_data)
+    plot_df = _to_frame(pollution_data, ['City', 'Date', 'AQI Value'])
 
     #get data
     if 'Date' not in plot_df.columns or plot_df['Date'].notna().sum() < 2:
         return {"error": "Cannot generate plot. Data does not contain sufficient date information."}
 
-    plot_df['Date'] = pd.to_datetime(plot_df['Date'], errors='coerce')
-    plot_df.dropna(subset=['Date', 'AQI Value'], inplace=True)
-    plot_df.sort_values('Date', inplace=True)
+    plot_df = plot_df.assign(Date=_ensure_datetime(plot_df['Date']))
+    plot_df = plot_df.dropna(subset=['Date', 'AQI Value']).sort_values('Date')
 
     if plot_df.empty:
         return {"error": "No valid data points remaining after cleaning for plotting."}
@@ -223,24 +493,26 @@ def plot_trends_tool(pollution_data: List[Dict[str, Any]], output_dir: str = "ai
     save_path = os.path.join(home_dir, output_dir)
     os.makedirs(save_path, exist_ok=True)
 
-    #plot
-    plt.style.use('seaborn-v0_8-whitegrid')
-    fig, ax = plt.subplots(figsize=(15, 8))
     cities = plot_df['City'].unique()
-    sns.lineplot(data=plot_df, x='Date', y='AQI Value', hue='City', marker='o', ax=ax)
-    ax.set_title(f'Air Quality Index (AQI) Trend for {", ".join(cities)}', fontsize=16)
-    ax.set_xlabel('Date', fontsize=12)
-    ax.set_ylabel('AQI Value', fontsize=12)
-    ax.legend(title='City')
-    fig.autofmt_xdate()
-    plt.tight_layout()
-
-    #save
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     filename = f"aqi_trend_{'_'.join(cities).replace(' ', '_')}_{timestamp}.png"
     full_path = os.path.join(save_path, filename)
-    plt.savefig(full_path)
-    plt.close(fig)
+
+    with _PLOT_LOCK:
+        #plot
+        _AX.clear()
+        sns.lineplot(data=plot_df, x='Date', y='AQI Value', hue='City', hue_order=cities, marker='o', ax=_AX)
+        _AX.set_title(f'Air Quality Index (AQI) Trend for {", ".join(cities)}', fontsize=16)
+        _AX.set_xlabel('Date', fontsize=12)
+        _AX.set_ylabel('AQI Value', fontsize=12)
+        _AX.legend(title='City')
+        # clear() resets the axis, so the date ticks are set up again on each call
+        _AX.xaxis.set_major_locator(mdates.AutoDateLocator())
+        _AX.xaxis.set_major_formatter(mdates.DateFormatter('%Y-%m-%d'))
+        plt.setp(_AX.get_xticklabels(), rotation=30, ha='right')
+
+        #save
+        _FIG.savefig(full_path)
 
     return {"status": f"Plot successfully generated for {', '.join(cities)}.", "plot_path": full_path}
 